@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+
+"""Page-view replay against a running Confluence, with a simulated browser cache.
+
+Each page is fetched in turn, along with the scripts, stylesheets and images it
+references from the same origin. Those resources are cached according to their
+Cache-Control/Expires headers, and stale ones are revalidated with
+If-None-Match/If-Modified-Since as a browser would. The number of requests, the
+bytes transferred (compressed bodies plus estimated headers) and the decoded
+body bytes are reported as JSON. Compare a run with
+ATL_TOMCAT_EXPIRES_FILTER enabled against one without it to see what the
+caching policy saves.
+
+    python3 benchmarks/cache_replay.py --base-url http://localhost:8090 --pages pages.txt --views 20
+"""
+
+import argparse
+import email.utils
+import html.parser
+import json
+import os
+import re
+import sys
+import time
+import urllib.parse
+
+import requests
+
+
+MAX_AGE = re.compile(r'max-age=(\d+)')
+
+
+class ResourceLinks(html.parser.HTMLParser):
+    def __init__(self):
+        super().__init__()
+        self.links = []
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag in ('script', 'img') and attrs.get('src'):
+            self.links.append(attrs['src'])
+        elif tag == 'link' and attrs.get('href') and 'stylesheet' in (attrs.get('rel') or ''):
+            self.links.append(attrs['href'])
+
+
+def freshness_lifetime(headers):
+    """Seconds a response may be reused without revalidation, per RFC 7234."""
+    cache_control = headers.get('Cache-Control', '')
+    if 'no-store' in cache_control or 'no-cache' in cache_control:
+        return 0
+    match = MAX_AGE.search(cache_control)
+    if match:
+        return int(match.group(1))
+    if 'Expires' in headers:
+        try:
+            expires = email.utils.parsedate_to_datetime(headers['Expires'])
+            date = email.utils.parsedate_to_datetime(headers.get('Date', headers['Expires']))
+            return max(0, (expires - date).total_seconds())
+        except (TypeError, ValueError):
+            return 0
+    return 0
+
+
+class BrowserCache:
+    def __init__(self, session):
+        self.session = session
+        self.entries = {}
+        self.stats = {'requests': 0, 'bytes': 0, 'decoded_bytes': 0, 'cache_hits': 0, 'revalidations': 0,
+                      'not_modified': 0}
+
+    def fetch(self, url, cacheable=True):
+        entry = self.entries.get(url)
+        if cacheable and entry and time.monotonic() < entry['expires']:
+            self.stats['cache_hits'] += 1
+            return entry['body']
+
+        headers = {}
+        if cacheable and entry:
+            self.stats['revalidations'] += 1
+            if entry['etag']:
+                headers['If-None-Match'] = entry['etag']
+            if entry['last_modified']:
+                headers['If-Modified-Since'] = entry['last_modified']
+
+        r = self.session.get(url, headers=headers, stream=True)
+        content = r.raw.read(decode_content=True)
+        self.stats['requests'] += 1
+        # tell() counts the body as read from the socket, i.e. before gzip decoding; the
+        # headers aren't available as sent, so their size is estimated from the parsed ones
+        self.stats['bytes'] += r.raw.tell() + sum(len(k) + len(v) + 4 for k, v in r.headers.items())
+        self.stats['decoded_bytes'] += len(content)
+
+        if r.status_code == 304 and entry:
+            self.stats['not_modified'] += 1
+            body = entry['body']
+        else:
+            body = content
+        if cacheable and r.status_code in (200, 304):
+            self.entries[url] = {
+                'body': body,
+                'expires': time.monotonic() + freshness_lifetime(r.headers),
+                'etag': r.headers.get('ETag', entry and entry['etag']),
+                'last_modified': r.headers.get('Last-Modified', entry and entry['last_modified']),
+            }
+        return body
+
+
+def replay(base_url, pages, views, session):
+    cache = BrowserCache(session)
+    origin = urllib.parse.urlsplit(base_url).netloc
+    for view in range(views):
+        page_url = urllib.parse.urljoin(base_url, pages[view % len(pages)])
+        parser = ResourceLinks()
+        parser.feed(cache.fetch(page_url, cacheable=False).decode('utf-8', 'replace'))
+        for link in parser.links:
+            url = urllib.parse.urljoin(page_url, link)
+            if urllib.parse.urlsplit(url).netloc == origin:
+                cache.fetch(url)
+    return cache.stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay page views against Confluence with a simulated browser cache.')
+    parser.add_argument('--base-url', default=os.environ.get('CONFLUENCE_BASE_URL', 'http://localhost:8090'))
+    parser.add_argument('--pages', required=True, help='file with one page path per line, e.g. /display/TEST/Home')
+    parser.add_argument('--views', type=int, default=20, help='number of page views to replay (default: 20)')
+    parser.add_argument('--user', default=os.environ.get('CONFLUENCE_ADMIN'))
+    parser.add_argument('--password', default=os.environ.get('CONFLUENCE_ADMIN_PWD'))
+    parser.add_argument('--output', help='write the results to this file as well as stdout')
+    args = parser.parse_args()
+
+    with open(args.pages) as f:
+        pages = [line.strip() for line in f if line.strip() and not line.startswith('#')]
+    if not pages:
+        sys.exit(f'No pages found in {args.pages}')
+
+    session = requests.Session()
+    if args.user:
+        session.auth = (args.user, args.password)
+    results = dict(replay(args.base_url, pages, args.views, session), base_url=args.base_url, views=args.views)
+
+    output = json.dumps(results, indent=2, sort_keys=True)
+    print(output)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+
+"""Benchmark of the JVM_TUNING_PROFILE values under a fixed HTTP load.
+
+Each image flavour is started once per profile (and once without one), with GC
+logging to a file. After a warm-up, a fixed number of concurrent clients
+request the given paths for a fixed duration. For every run the request
+throughput and latency, the GC pauses and GC time during the load, the JVM's
+resident set size and any StackOverflowError in the logs are recorded.
+
+Each profile is then checked against what it claims to do, relative to the
+default configuration measured in the same run:
+
+* throughput: no lower request throughput, and no more time spent in GC
+* low-latency: p99 GC pause within the 100ms pause target
+* small-footprint: no larger resident set size
+* all profiles: no failed requests and no StackOverflowError
+
+    python3 benchmarks/profile_benchmark.py --output profiles.json
+
+See DEVELOPMENT.md for details.
+"""
+
+import argparse
+import concurrent.futures
+import json
+import re
+import statistics
+import sys
+import time
+
+import docker
+import requests
+
+from startup_benchmark import PORT, BOOTSTRAP_CLASS, build_image, image_flavours, jvm_footprint, wait_for_state
+
+
+GC_LOG = '/tmp/profile-benchmark-gc.log'
+GC_LOG_ARGS = f'-Xlog:gc,gc+phases:file={GC_LOG}:uptime,tags'
+# e.g. '[12.345s][gc         ] GC(3) Pause Young (Normal) (G1 Evacuation Pause) 24M->4M(256M) 3.456ms'
+# or, for ZGC, '[12.345s][gc,phases  ] GC(3) Pause Mark Start 0.015ms'
+GC_PAUSE = re.compile(r'^\[(\d+\.\d+)s\]\[gc(?:,phases)?\s*\] GC\(\d+\) Pause .* (\d+\.\d+)ms$', re.MULTILINE)
+VM_UPTIME = re.compile(r'(\d+\.\d+) s')
+LOW_LATENCY_PAUSE_TARGET_MS = 100
+
+METRICS = ('requests_per_second', 'latency_p99_ms', 'errors', 'gc_pause_count', 'gc_pause_p99_ms',
+           'gc_pause_max_ms', 'gc_time_percent', 'rss_mib', 'stack_overflows')
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0
+    values = sorted(values)
+    return values[max(0, int(len(values) * fraction + 0.5) - 1)]
+
+
+def vm_uptime(container, pid, run_user):
+    output = container.exec_run(['jcmd', pid, 'VM.uptime'], user=run_user).output.decode()
+    return float(VM_UPTIME.search(output).group(1))
+
+
+def gc_pauses(log, start, end):
+    """Pause times in ms from a unified GC log, for pauses that started between start and end uptime."""
+    return [float(ms) for uptime, ms in GC_PAUSE.findall(log) if start <= float(uptime) <= end]
+
+
+def generate_load(base_url, paths, clients, duration, auth):
+    """Request paths round-robin from concurrent clients; return the latencies in ms and the error count."""
+    deadline = time.monotonic() + duration
+
+    def client(offset):
+        session = requests.Session()
+        session.auth = auth
+        latencies, errors, i = [], 0, offset
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            try:
+                r = session.get(base_url + paths[i % len(paths)], timeout=30)
+                if r.status_code >= 500:
+                    errors += 1
+            except requests.RequestException:
+                errors += 1
+            latencies.append((time.perf_counter() - start) * 1000)
+            i += 1
+        return latencies, errors
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=clients) as executor:
+        results = list(executor.map(client, range(clients)))
+    return [ms for latencies, _ in results for ms in latencies], sum(errors for _, errors in results)
+
+
+def run_once(client, image, environment, args, paths, auth):
+    started = time.monotonic()
+    container = client.containers.run(image.id, detach=True, environment=environment, ports={PORT: None})
+    try:
+        container.reload()
+        base_url = f"http://localhost:{container.ports[f'{PORT}/tcp'][0]['HostPort']}"
+        wait_for_state(f'{base_url}/status', started, args.max_wait)
+
+        generate_load(base_url, paths, args.clients, args.warmup, auth)
+        pid = container.exec_run(['pgrep', '-f', BOOTSTRAP_CLASS]).output.decode().split()[0]
+        run_user = container.attrs['Config']['User'] or 'confluence'
+        load_start = vm_uptime(container, pid, run_user)
+        latencies, errors = generate_load(base_url, paths, args.clients, args.duration, auth)
+        load_end = vm_uptime(container, pid, run_user)
+
+        pauses = gc_pauses(container.exec_run(['cat', GC_LOG]).output.decode(), load_start, load_end)
+        rss_mib, _ = jvm_footprint(container)
+        logs = container.logs().decode(errors='replace') + container.exec_run(
+            ['sh', '-c', 'cat "$CONFLUENCE_HOME"/logs/*.log /opt/atlassian/confluence/logs/*.log 2>/dev/null']
+        ).output.decode(errors='replace')
+    finally:
+        container.remove(force=True)
+    return {
+        'requests_per_second': round(len(latencies) / (load_end - load_start), 1),
+        'latency_p99_ms': round(percentile(latencies, 0.99), 1),
+        'errors': errors,
+        'gc_pause_count': len(pauses),
+        'gc_pause_p99_ms': round(percentile(pauses, 0.99), 2),
+        'gc_pause_max_ms': round(max(pauses, default=0), 2),
+        'gc_time_percent': round(sum(pauses) / ((load_end - load_start) * 1000) * 100, 3),
+        'rss_mib': round(rss_mib, 1),
+        'stack_overflows': logs.count('StackOverflowError'),
+    }
+
+
+def summarise(runs):
+    summary = {}
+    for run in runs:
+        metrics = summary.setdefault(run['config'], {m: [] for m in METRICS})
+        for metric in METRICS:
+            metrics[metric].append(run[metric])
+    return {config: {metric: {'median': statistics.median(values), 'min': min(values), 'max': max(values)}
+                     for metric, values in metrics.items()}
+            for config, metrics in summary.items()}
+
+
+def check_claims(summary, tolerance):
+    """List the profiles that do not behave as documented, compared with the default of the same flavour."""
+    failures = []
+    for config, metrics in summary.items():
+        flavour, profile = config.rsplit('/', 1)
+        median = {metric: values['median'] for metric, values in metrics.items()}
+        default = {metric: values['median'] for metric, values in summary.get(f'{flavour}/default', {}).items()}
+
+        if median['errors'] or median['stack_overflows']:
+            failures.append(f"{config}: {median['errors']} failed requests, "
+                            f"{median['stack_overflows']} StackOverflowErrors")
+        if profile == 'low-latency' and median['gc_pause_p99_ms'] > LOW_LATENCY_PAUSE_TARGET_MS:
+            failures.append(f"{config}: p99 GC pause {median['gc_pause_p99_ms']}ms exceeds the "
+                            f"{LOW_LATENCY_PAUSE_TARGET_MS}ms target")
+        if not default:
+            continue
+        if profile == 'throughput':
+            if median['requests_per_second'] < default['requests_per_second'] * (1 - tolerance):
+                failures.append(f"{config}: {median['requests_per_second']} requests/s vs "
+                                f"{default['requests_per_second']} without a profile")
+            if median['gc_time_percent'] > default['gc_time_percent'] * (1 + tolerance):
+                failures.append(f"{config}: {median['gc_time_percent']}% GC time vs "
+                                f"{default['gc_time_percent']}% without a profile")
+        if profile == 'small-footprint' and median['rss_mib'] > default['rss_mib'] * (1 + tolerance):
+            failures.append(f"{config}: RSS {median['rss_mib']} MiB vs {default['rss_mib']} MiB without a profile")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check each JVM tuning profile under a fixed HTTP load.')
+    parser.add_argument('--jdk', type=int, action='append',
+                        help='JDK flavour to benchmark; may be repeated (default: all flavours)')
+    parser.add_argument('--image', action='append', default=[], metavar='JDK=IMAGE',
+                        help='use an existing image for a flavour instead of building it')
+    parser.add_argument('--confluence-version', help='Confluence version to build (default: Dockerfile default)')
+    parser.add_argument('--memory', default='2048m', help='heap size for every run (default: 2048m)')
+    parser.add_argument('--profiles', default='default,throughput,low-latency,small-footprint',
+                        help="comma-separated JVM_TUNING_PROFILE values; 'default' leaves it unset")
+    parser.add_argument('--env', action='append', default=[], metavar='NAME=VALUE',
+                        help='extra environment variable for every run, e.g. a database configuration')
+    parser.add_argument('--paths', help='file with one path to request per line (default: /status and the setup page)')
+    parser.add_argument('--user', help='user for authenticated paths')
+    parser.add_argument('--password')
+    parser.add_argument('--clients', type=int, default=16, help='concurrent clients (default: 16)')
+    parser.add_argument('--warmup', type=int, default=60, help='seconds of unmeasured load first (default: 60)')
+    parser.add_argument('--duration', type=int, default=300, help='seconds of measured load (default: 300)')
+    parser.add_argument('--repeat', type=int, default=1, help='runs per profile (default: 1)')
+    parser.add_argument('--max-wait', type=int, default=600, help='seconds to wait for startup (default: 600)')
+    parser.add_argument('--tolerance', type=float, default=0.10,
+                        help='allowed difference from the default configuration, as a fraction (default: 0.10)')
+    parser.add_argument('--output', default='profile-benchmark.json', help='results file to write')
+    args = parser.parse_args()
+
+    if args.paths:
+        with open(args.paths) as f:
+            paths = [line.strip() for line in f if line.strip() and not line.startswith('#')]
+    else:
+        paths = ['/status', '/setup/setupstart.action']
+    auth = (args.user, args.password) if args.user else None
+
+    client = docker.from_env()
+    flavours = image_flavours()
+    prebuilt = dict(spec.split('=', 1) for spec in args.image)
+    extra_env = dict(spec.split('=', 1) for spec in args.env)
+
+    runs = []
+    for jdk in args.jdk or sorted(flavours):
+        if str(jdk) in prebuilt:
+            image = client.images.get(prebuilt[str(jdk)])
+        else:
+            image = build_image(client, jdk, flavours[jdk], args.confluence_version)
+
+        for profile in args.profiles.split(','):
+            environment = dict(extra_env, JVM_MINIMUM_MEMORY=args.memory, JVM_MAXIMUM_MEMORY=args.memory)
+            environment['JVM_SUPPORT_RECOMMENDED_ARGS'] = f"{extra_env.get('JVM_SUPPORT_RECOMMENDED_ARGS', '')} " \
+                                                          f"{GC_LOG_ARGS}".strip()
+            if profile != 'default':
+                environment['JVM_TUNING_PROFILE'] = profile
+            config = f'jdk{jdk}/{profile}'
+            for attempt in range(1, args.repeat + 1):
+                print(f'Running {config} ({attempt}/{args.repeat})', file=sys.stderr)
+                runs.append(dict(run_once(client, image, environment, args, paths, auth), config=config))
+
+    summary = summarise(runs)
+    failures = check_claims(summary, args.tolerance)
+    with open(args.output, 'w') as f:
+        json.dump({'environment': extra_env, 'paths': paths, 'clients': args.clients, 'duration': args.duration,
+                   'runs': runs, 'summary': summary, 'failures': failures}, f, indent=2, sort_keys=True)
+    print(f'Results written to {args.output}', file=sys.stderr)
+
+    for failure in failures:
+        print(f'PROFILE CHECK FAILED {failure}', file=sys.stderr)
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+
+"""Container startup-time and memory-footprint benchmark.
+
+Runs every image flavour from the `images` dict in pipelines-generator.py
+across a matrix of heap sizes and JVM tuning profiles, repeating each
+combination, and writes the results as JSON. If a baseline results file is
+given, the run fails when the median of any metric regresses by more than
+the tolerance.
+
+    python3 benchmarks/startup_benchmark.py --output results.json
+    python3 benchmarks/startup_benchmark.py --baseline results.json --tolerance 0.15
+
+See DEVELOPMENT.md for details.
+"""
+
+import argparse
+import importlib.util
+import itertools
+import json
+import os
+import re
+import statistics
+import sys
+import time
+
+import docker
+import requests
+
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PORT = 8090
+TERMINAL_STATES = ('FIRST_RUN', 'RUNNING')
+BOOTSTRAP_CLASS = 'org.apache.catalina.startup.Bootstrap'
+
+# Lower is better for every metric
+METRICS = ('status_seconds', 'ready_seconds', 'rss_mib', 'heap_used_mib', 'image_mib')
+
+HEAP_USED = re.compile(r'used (\d+)([KMG])')
+UNIT_MIB = {'K': 1 / 1024, 'M': 1, 'G': 1024}
+
+
+def image_flavours():
+    """The JDK flavours and base images defined for the release pipeline."""
+    spec = importlib.util.spec_from_file_location('pipelines_generator',
+                                                  os.path.join(REPO_DIR, 'pipelines-generator.py'))
+    generator = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(generator)
+    return {jdk: appdata['base_image'] for jdk, appdata in generator.images['Confluence'].items()}
+
+
+def build_image(client, jdk, base_image, confluence_version):
+    tag = f'confluence-benchmark:jdk{jdk}'
+    buildargs = {'BASE_IMAGE': base_image}
+    if confluence_version:
+        buildargs['CONFLUENCE_VERSION'] = confluence_version
+    print(f'Building {tag} from {base_image}', file=sys.stderr)
+    image, _ = client.images.build(path=REPO_DIR, tag=tag, buildargs=buildargs, rm=True)
+    return image
+
+
+def wait_for_state(url, started, max_wait):
+    """Return the seconds until the status endpoint first answers, and until it reports a terminal state."""
+    status_seconds = None
+    while time.monotonic() - started < max_wait:
+        try:
+            r = requests.get(url, timeout=5)
+            if status_seconds is None:
+                status_seconds = time.monotonic() - started
+            if r.status_code == 200 and r.json().get('state') in TERMINAL_STATES:
+                return status_seconds, time.monotonic() - started, r.json()['state']
+        except (requests.RequestException, ValueError):
+            pass
+        time.sleep(0.5)
+    raise TimeoutError(f'{url} did not reach {TERMINAL_STATES} within {max_wait}s')
+
+
+def jvm_footprint(container):
+    """Return the JVM's resident set size, and its heap used after a full GC, in MiB."""
+    pid = container.exec_run(['pgrep', '-f', BOOTSTRAP_CLASS]).output.decode().split()[0]
+    status = container.exec_run(['cat', f'/proc/{pid}/status']).output.decode()
+    rss_kib = int(re.search(r'VmRSS:\s+(\d+) kB', status).group(1))
+
+    run_user = container.attrs['Config']['User'] or 'confluence'
+    container.exec_run(['jcmd', pid, 'GC.run'], user=run_user)
+    heap_info = container.exec_run(['jcmd', pid, 'GC.heap_info'], user=run_user).output.decode()
+    heap_used = sum(int(amount) * UNIT_MIB[unit]
+                    for line in heap_info.splitlines() if 'Metaspace' not in line and 'class space' not in line
+                    for amount, unit in HEAP_USED.findall(line))
+    return rss_kib / 1024, heap_used
+
+
+def run_once(client, image, environment, max_wait):
+    started = time.monotonic()
+    container = client.containers.run(image.id, detach=True, environment=environment, ports={PORT: None})
+    try:
+        container.reload()
+        host_port = container.ports[f'{PORT}/tcp'][0]['HostPort']
+        status_seconds, ready_seconds, state = wait_for_state(f'http://localhost:{host_port}/status',
+                                                              started, max_wait)
+        rss_mib, heap_used_mib = jvm_footprint(container)
+    finally:
+        container.remove(force=True)
+    return {
+        'state': state,
+        'status_seconds': round(status_seconds, 2),
+        'ready_seconds': round(ready_seconds, 2),
+        'rss_mib': round(rss_mib, 1),
+        'heap_used_mib': round(heap_used_mib, 1),
+        'image_mib': round(image.attrs['Size'] / (1024 * 1024), 1),
+    }
+
+
+def summarise(runs):
+    summary = {}
+    for run in runs:
+        metrics = summary.setdefault(run['config'], {m: [] for m in METRICS})
+        for metric in METRICS:
+            metrics[metric].append(run[metric])
+    return {config: {metric: {'median': statistics.median(values), 'min': min(values), 'max': max(values)}
+                     for metric, values in metrics.items()}
+            for config, metrics in summary.items()}
+
+
+def regressions(summary, baseline, tolerance):
+    """List the metrics whose median is worse than the baseline median by more than tolerance."""
+    failures = []
+    for config, metrics in summary.items():
+        for metric, values in metrics.items():
+            previous = baseline.get(config, {}).get(metric)
+            if previous and values['median'] > previous['median'] * (1 + tolerance):
+                failures.append(f"{config} {metric}: {values['median']} vs baseline {previous['median']} "
+                                f"(+{(values['median'] / previous['median'] - 1) * 100:.1f}%)")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark container startup time and memory footprint.')
+    parser.add_argument('--jdk', type=int, action='append',
+                        help='JDK flavour to benchmark; may be repeated (default: all flavours)')
+    parser.add_argument('--image', action='append', default=[], metavar='JDK=IMAGE',
+                        help='use an existing image for a flavour instead of building it')
+    parser.add_argument('--confluence-version', help='Confluence version to build (default: Dockerfile default)')
+    parser.add_argument('--memory', default='1024m,2048m',
+                        help='comma-separated maximum heap sizes (default: 1024m,2048m)')
+    parser.add_argument('--profiles', default='default,throughput,low-latency,small-footprint',
+                        help="comma-separated JVM_TUNING_PROFILE values; 'default' leaves it unset")
+    parser.add_argument('--env', action='append', default=[], metavar='NAME=VALUE',
+                        help='extra environment variable for every run, e.g. ATL_TOMCAT_JARSCAN_PRUNE=true')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per combination (default: 3)')
+    parser.add_argument('--max-wait', type=int, default=600, help='seconds to wait for startup (default: 600)')
+    parser.add_argument('--output', default='startup-benchmark.json', help='results file to write')
+    parser.add_argument('--baseline', help='results file to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.10,
+                        help='allowed regression against the baseline, as a fraction (default: 0.10)')
+    args = parser.parse_args()
+
+    client = docker.from_env()
+    flavours = image_flavours()
+    prebuilt = dict(spec.split('=', 1) for spec in args.image)
+    extra_env = dict(spec.split('=', 1) for spec in args.env)
+
+    runs = []
+    for jdk in args.jdk or sorted(flavours):
+        if str(jdk) in prebuilt:
+            image = client.images.get(prebuilt[str(jdk)])
+        else:
+            image = build_image(client, jdk, flavours[jdk], args.confluence_version)
+
+        for memory, profile in itertools.product(args.memory.split(','), args.profiles.split(',')):
+            environment = dict(extra_env, JVM_MINIMUM_MEMORY=memory, JVM_MAXIMUM_MEMORY=memory)
+            if profile != 'default':
+                environment['JVM_TUNING_PROFILE'] = profile
+            config = f'jdk{jdk}/{memory}/{profile}'
+            for attempt in range(1, args.repeat + 1):
+                print(f'Running {config} ({attempt}/{args.repeat})', file=sys.stderr)
+                runs.append(dict(run_once(client, image, environment, args.max_wait), config=config))
+
+    summary = summarise(runs)
+    with open(args.output, 'w') as f:
+        json.dump({'environment': extra_env, 'runs': runs, 'summary': summary}, f, indent=2, sort_keys=True)
+    print(f'Results written to {args.output}', file=sys.stderr)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            failures = regressions(summary, json.load(f)['summary'], args.tolerance)
+        for failure in failures:
+            print(f'REGRESSION {failure}', file=sys.stderr)
+        if failures:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+
+"""Attachment upload throughput against a running Confluence.
+
+A scratch page is created in the given space and a number of attachments of
+a fixed size are uploaded to it through the REST API, optionally from several
+concurrent clients. The aggregate throughput in MB/s and the per-upload
+latency are reported as JSON, and the page is deleted afterwards. Compare a run
+with ATL_MULTIPART_SAVEDIR on a node-local volume against one with the default,
+which stages uploads in the local home, to see what the setting saves.
+
+    python3 benchmarks/upload_benchmark.py --base-url http://localhost:8090 --space TEST --count 50 --size-mib 20
+"""
+
+import argparse
+import concurrent.futures
+import json
+import os
+import statistics
+import sys
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+NO_CHECK = {'X-Atlassian-Token': 'no-check'}
+
+
+def create_page(session, api_url, space):
+    data = {
+        'type': 'page',
+        'title': f'Upload benchmark {int(time.time())}',
+        'space': {'key': space},
+        'body': {'storage': {'value': '<p>Scratch page for upload_benchmark.py</p>', 'representation': 'storage'}},
+    }
+    r = session.post(f'{api_url}/content', json=data)
+    r.raise_for_status()
+    return r.json()['id']
+
+
+def upload(session, api_url, page_id, index, payload):
+    """Upload one attachment, returning the seconds it took."""
+    start = time.perf_counter()
+    r = session.post(f'{api_url}/content/{page_id}/child/attachment', headers=NO_CHECK,
+                     files={'file': (f'upload-{index}.bin', payload, 'application/octet-stream')})
+    r.raise_for_status()
+    return time.perf_counter() - start
+
+
+def run(session, api_url, page_id, count, size, clients):
+    # Random content, so that neither compression nor deduplication flatters the result
+    payload = os.urandom(size)
+    start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=clients) as executor:
+        seconds = list(executor.map(lambda i: upload(session, api_url, page_id, i, payload), range(count)))
+    elapsed = time.perf_counter() - start
+    return {
+        'uploads': count,
+        'size_bytes': size,
+        'clients': clients,
+        'elapsed_seconds': round(elapsed, 2),
+        'mb_per_second': round(count * size / elapsed / 1000000, 2),
+        'upload_p50_seconds': round(statistics.median(seconds), 3),
+        'upload_max_seconds': round(max(seconds), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure attachment upload throughput against Confluence.')
+    parser.add_argument('--base-url', default=os.environ.get('CONFLUENCE_BASE_URL', 'http://localhost:8090'))
+    parser.add_argument('--space', required=True, help='key of an existing space to create the scratch page in')
+    parser.add_argument('--count', type=int, default=20, help='number of attachments to upload (default: 20)')
+    parser.add_argument('--size-mib', type=float, default=10, help='size of each attachment in MiB (default: 10)')
+    parser.add_argument('--clients', type=int, default=1, help='concurrent uploads (default: 1)')
+    parser.add_argument('--user', default=os.environ.get('CONFLUENCE_ADMIN'))
+    parser.add_argument('--password', default=os.environ.get('CONFLUENCE_ADMIN_PWD'))
+    parser.add_argument('--keep', action='store_true', help='keep the scratch page and its attachments')
+    parser.add_argument('--output', help='write the results to this file as well as stdout')
+    args = parser.parse_args()
+    if args.count < 1 or args.size_mib <= 0 or args.clients < 1:
+        parser.error('--count, --size-mib and --clients must be positive')
+
+    api_url = f"{args.base_url.rstrip('/')}/rest/api"
+    session = requests.Session()
+    session.mount('http://', HTTPAdapter(pool_maxsize=args.clients))
+    session.mount('https://', HTTPAdapter(pool_maxsize=args.clients))
+    if args.user:
+        session.auth = (args.user, args.password)
+
+    page_id = create_page(session, api_url, args.space)
+    try:
+        results = run(session, api_url, page_id, args.count, int(args.size_mib * 1024 * 1024), args.clients)
+    except requests.HTTPError as e:
+        sys.exit(f'Upload failed: {e}')
+    finally:
+        if not args.keep:
+            session.delete(f'{api_url}/content/{page_id}')
+    results['base_url'] = args.base_url
+
+    output = json.dumps(results, indent=2, sort_keys=True)
+    print(output)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+
+
+if __name__ == '__main__':
+    main()
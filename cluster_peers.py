@@ -0,0 +1,106 @@
+import concurrent.futures
+import logging
+import socket
+import time
+
+
+def _split(text):
+    return [peer.strip() for peer in text.replace('\n', ',').split(',') if peer.strip()]
+
+
+def resolve_dns(name):
+    """All addresses of a DNS name, e.g. a Kubernetes headless service."""
+    try:
+        return sorted({info[4][0] for info in socket.getaddrinfo(name, None, socket.AF_INET, socket.SOCK_STREAM)})
+    except socket.gaierror:
+        return []
+
+
+def resolve_file(path):
+    """Peers listed in a file, comma or newline separated, e.g. maintained in the shared home."""
+    try:
+        with open(path) as f:
+            return _split(''.join(line for line in f if not line.lstrip().startswith('#')))
+    except FileNotFoundError:
+        return []
+    except OSError as e:
+        logging.warning(f"Unable to read cluster peers file {path}: {e}")
+        return []
+
+
+def resolve_static(peers):
+    """A fixed comma-separated list."""
+    return _split(peers)
+
+
+# Peer sources, selected by the scheme of ATL_CLUSTER_PEERS_SOURCE, e.g. 'dns:confluence-headless'
+RESOLVERS = {
+    'dns': resolve_dns,
+    'file': resolve_file,
+    'static': resolve_static,
+}
+
+
+def local_addresses():
+    addresses = {'127.0.0.1'}
+    try:
+        addresses.update(info[4][0] for info in socket.getaddrinfo(socket.gethostname(), None, socket.AF_INET))
+    except socket.gaierror:
+        pass
+    return addresses
+
+
+def is_reachable(host, port, timeout):
+    try:
+        with socket.create_connection((host, port), timeout=timeout):
+            return True
+    except OSError:
+        return False
+
+
+def discover_peers(source, port, timeout):
+    """Resolve candidate peers from source and find the remote ones accepting connections on port.
+
+    Candidates are probed in parallel, so the time taken is bounded by the
+    timeout rather than growing with the size of the cluster. This node's own
+    addresses are never probed or returned, as Hazelcast is not listening yet.
+    Returns the reachable remote peers, all candidates and the time taken in
+    seconds.
+    """
+    start = time.monotonic()
+    scheme, sep, argument = source.partition(':')
+    if not sep or scheme not in RESOLVERS:
+        raise ValueError(f"Invalid cluster peers source '{source}'; expected one of "
+                         f"{', '.join(f'{s}:...' for s in RESOLVERS)}")
+    candidates = RESOLVERS[scheme](argument)
+
+    own = local_addresses()
+    remote = [peer for peer in candidates if peer not in own]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, min(64, len(remote)))) as executor:
+        reachable = executor.map(lambda peer: is_reachable(peer, port, timeout), remote)
+        live = [peer for peer, up in zip(remote, reachable) if up]
+    return live, candidates, time.monotonic() - start
+
+
+def configure(env):
+    """Replace atl_cluster_peers in env with the peers discovered from atl_cluster_peers_source.
+
+    If none of the candidates is reachable yet, e.g. when the whole cluster is
+    starting at once, all of them are used, as pruning would leave every node on
+    its own. If the source yields no candidates, atl_cluster_peers is left as it
+    is. Raises ValueError for invalid settings.
+    """
+    source = env['atl_cluster_peers_source']
+    peers, candidates, elapsed = discover_peers(source,
+                                                int(env.get('atl_cluster_peers_port', '5801')),
+                                                float(env.get('atl_cluster_peers_probe_timeout', '0.5')))
+    if peers:
+        env['atl_cluster_peers'] = ','.join(peers)
+        logging.info(f"Resolved cluster peers '{env['atl_cluster_peers']}' from {source} in {elapsed:.2f}s")
+    elif candidates:
+        env['atl_cluster_peers'] = ','.join(candidates)
+        logging.warning(f"No cluster peers from {source} are reachable yet; "
+                        f"using all candidates '{env['atl_cluster_peers']}'")
+    else:
+        logging.warning(f"No cluster peers found from {source}; "
+                        f"using ATL_CLUSTER_PEERS '{env.get('atl_cluster_peers', '')}'")
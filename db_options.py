@@ -0,0 +1,103 @@
+import re
+
+
+# Hikari pool settings, in milliseconds, and the minimum value Hikari accepts for each
+HIKARI_TIMINGS = {
+    'atl_db_maxlifetime': 30000,
+    'atl_db_connectiontimeout': 250,
+    'atl_db_leakdetectionthreshold': 2000,
+    'atl_db_keepalivetime': 30000,
+}
+
+
+class SignedInt(int):
+    """Value type of integer properties where a negative value has a meaning."""
+
+
+# Performance-related JDBC driver properties accepted per atl_db_type, and their value types
+DRIVER_PROPERTIES = {
+    'postgresql': {
+        'reWriteBatchedInserts': bool,
+        # -1 always uses server-prepared statements
+        'prepareThreshold': SignedInt,
+        'preparedStatementCacheQueries': int,
+        'preparedStatementCacheSizeMiB': int,
+        'defaultRowFetchSize': int,
+        'tcpKeepAlive': bool,
+    },
+    'mysql': {
+        'cachePrepStmts': bool,
+        'prepStmtCacheSize': int,
+        'prepStmtCacheSqlLimit': int,
+        'useServerPrepStmts': bool,
+        'rewriteBatchedStatements': bool,
+        'useLocalSessionState': bool,
+        'cacheServerConfiguration': bool,
+    },
+    'mssql': {
+        'disableStatementPooling': bool,
+        'statementPoolingCacheSize': int,
+        'sendStringParametersAsUnicode': bool,
+    },
+    'oracle': {
+        'oracle.jdbc.implicitStatementCacheSize': int,
+        'defaultRowPrefetch': int,
+    },
+}
+DRIVER_PROPERTIES['oracle12c'] = DRIVER_PROPERTIES['oracle']
+
+
+def _check_value(name, value, kind):
+    if kind is bool and value.lower() not in ('true', 'false'):
+        raise ValueError(f"'{name}' must be 'true' or 'false', not '{value}'")
+    # Not str.isdigit(), which also accepts digits the JVM won't parse, such as '²'
+    if kind is int and not re.fullmatch(r'[0-9]+', value):
+        raise ValueError(f"'{name}' must be a non-negative integer, not '{value}'")
+    if kind is SignedInt and not re.fullmatch(r'-?[0-9]+', value):
+        raise ValueError(f"'{name}' must be an integer, not '{value}'")
+    return value.lower() if kind is bool else value
+
+
+# Hikari settings where 0 switches the feature off rather than being too small
+HIKARI_DISABLEABLE = ('atl_db_maxlifetime', 'atl_db_leakdetectionthreshold', 'atl_db_keepalivetime')
+
+
+def validate_hikari_timings(env):
+    """Check the optional Hikari timing settings.
+
+    0 means no maximum lifetime, and disables leak detection and keepalive.
+    """
+    for key, minimum in HIKARI_TIMINGS.items():
+        if key not in env:
+            continue
+        value = int(_check_value(key.upper(), env[key], int))
+        if value < minimum and not (key in HIKARI_DISABLEABLE and value == 0):
+            raise ValueError(f"'{key.upper()}' must be at least {minimum}ms, not {value}")
+
+    max_lifetime = int(env.get('atl_db_maxlifetime', 1800000))
+    if max_lifetime == 0:
+        return
+    if int(env.get('atl_db_keepalivetime', 0)) >= max_lifetime:
+        raise ValueError("'ATL_DB_KEEPALIVETIME' must be less than 'ATL_DB_MAXLIFETIME'")
+    if int(env.get('atl_db_leakdetectionthreshold', 0)) >= max_lifetime:
+        raise ValueError("'ATL_DB_LEAKDETECTIONTHRESHOLD' must be less than 'ATL_DB_MAXLIFETIME'")
+
+
+def parse_driver_properties(db_type, spec):
+    """Parse and validate 'name=value,...' driver properties for db_type.
+
+    Returns the properties as a normalised 'name=value,...' string.
+    """
+    allowed = DRIVER_PROPERTIES.get(db_type)
+    if allowed is None:
+        raise ValueError(f"Driver properties are not supported for database type '{db_type}'")
+    properties = []
+    for prop in filter(None, (p.strip() for p in spec.split(','))):
+        name, sep, value = (part.strip() for part in prop.partition('='))
+        if not sep or not value:
+            raise ValueError(f"Invalid driver property '{prop}'; expected 'name=value'")
+        if name not in allowed:
+            raise ValueError(f"Unsupported driver property '{name}' for {db_type}; "
+                             f"supported properties are: {', '.join(allowed)}")
+        properties.append(f'{name}={_check_value(name, value, allowed[name])}')
+    return ','.join(properties)
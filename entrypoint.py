@@ -1,6 +1,16 @@
 #!/usr/bin/python3 -B
 
+import logging
+import os
+import sys
+
 from entrypoint_helpers import env, gen_cfg, str2bool_or, exec_app
+import cluster_peers
+from db_options import parse_driver_properties, validate_hikari_timings
+from jvm_profiles import java_major_version, profile_args
+from jvm_threads import start_sampler
+from local_storage import prepare_lucene_index, prepare_scratch_dir
+from tomcat_web_xml import install_fragment
 
 
 RUN_USER = env['run_user']
@@ -9,8 +19,80 @@ CONFLUENCE_INSTALL_DIR = env['confluence_install_dir']
 CONFLUENCE_HOME = env['confluence_home']
 UPDATE_CFG = str2bool_or(env.get('atl_force_cfg_update'), False)
 UNSET_SENSITIVE_VARS = str2bool_or(env.get('atl_unset_sensitive_env_vars'), True)
+JVM_TUNING_PROFILE = env.get('jvm_tuning_profile')
+THREAD_SAMPLER_INTERVAL = env.get('atl_thread_sampler_interval')
+THREAD_SAMPLER_MAX_DUMPS = env.get('atl_thread_sampler_max_dumps', '360')
+LUCENE_INDEX_LOCAL = str2bool_or(env.get('atl_lucene_index_local'), False)
+LUCENE_INDEX_PREFETCH = str2bool_or(env.get('atl_lucene_index_prefetch'), True)
+LUCENE_INDEX_PREFETCH_THREADS = env.get('atl_lucene_index_prefetch_threads', '8')
+MULTIPART_SAVEDIR = env.get('atl_multipart_savedir')
+CLUSTER_PEERS_SOURCE = env.get('atl_cluster_peers_source')
+EXPIRES_FILTER = str2bool_or(env.get('atl_tomcat_expires_filter'), False)
+SHUTDOWN_DRAIN_MARKER = env.get('atl_shutdown_drain_marker', '/tmp/confluence-draining')
+
+# A restarted container must not inherit the readiness marker of an interrupted shutdown
+try:
+    os.remove(SHUTDOWN_DRAIN_MARKER)
+except FileNotFoundError:
+    pass
+except OSError as e:
+    logging.warning(f"Unable to remove shutdown drain marker {SHUTDOWN_DRAIN_MARKER}: {e}")
+
+if JVM_TUNING_PROFILE:
+    try:
+        jdk_major = java_major_version()
+        tuning_args = profile_args(JVM_TUNING_PROFILE, jdk_major)
+    except ValueError as e:
+        logging.error(e)
+        sys.exit(1)
+    # Explicit JVM_SUPPORT_RECOMMENDED_ARGS come last so they override the profile
+    jvm_args = ' '.join(tuning_args + [env.get('jvm_support_recommended_args', '')]).strip()
+    os.environ['JVM_SUPPORT_RECOMMENDED_ARGS'] = jvm_args
+    logging.info(f"Applying JVM tuning profile '{JVM_TUNING_PROFILE}' for JDK {jdk_major}; "
+                 f"JVM_SUPPORT_RECOMMENDED_ARGS is now '{jvm_args}'")
+
+if LUCENE_INDEX_LOCAL:
+    try:
+        prepare_lucene_index(env.get('atl_lucene_index_dir'), RUN_USER, RUN_GROUP,
+                             LUCENE_INDEX_PREFETCH, LUCENE_INDEX_PREFETCH_THREADS)
+    except ValueError as e:
+        logging.error(e)
+        sys.exit(1)
+
+if 'atl_jdbc_url' in env:
+    try:
+        validate_hikari_timings(env)
+        if env.get('atl_db_driver_properties'):
+            env['atl_db_driver_properties'] = parse_driver_properties(env.get('atl_db_type'),
+                                                                      env['atl_db_driver_properties'])
+    except ValueError as e:
+        logging.error(f'Invalid database configuration: {e}')
+        sys.exit(1)
+
+if env.get('atl_cluster_type') == 'tcp_ip' and CLUSTER_PEERS_SOURCE:
+    try:
+        cluster_peers.configure(env)
+    except ValueError as e:
+        logging.error(e)
+        sys.exit(1)
+
+if MULTIPART_SAVEDIR:
+    # Only holds uploads in progress, so anything left over is from a previous run
+    try:
+        prepare_scratch_dir(MULTIPART_SAVEDIR, RUN_USER, RUN_GROUP)
+    except (ValueError, OSError) as e:
+        logging.error(f'Invalid ATL_MULTIPART_SAVEDIR: {e}')
+        sys.exit(1)
 
 gen_cfg('server.xml.j2', f'{CONFLUENCE_INSTALL_DIR}/conf/server.xml')
+# Filters can't be declared in server.xml, so they go into Tomcat's default web.xml
+if EXPIRES_FILTER:
+    gen_cfg('expires-filter.xml.j2', f'{CONFLUENCE_INSTALL_DIR}/conf/expires-filter.xml')
+try:
+    install_fragment(f'{CONFLUENCE_INSTALL_DIR}/conf/web.xml',
+                     f'{CONFLUENCE_INSTALL_DIR}/conf/expires-filter.xml' if EXPIRES_FILTER else None)
+except OSError as e:
+    logging.warning(f"Unable to update {CONFLUENCE_INSTALL_DIR}/conf/web.xml: {e}")
 gen_cfg('seraph-config.xml.j2',
         f'{CONFLUENCE_INSTALL_DIR}/confluence/WEB-INF/classes/seraph-config.xml')
 gen_cfg('confluence-init.properties.j2',
@@ -18,5 +100,10 @@ gen_cfg('confluence-init.properties.j2',
 gen_cfg('confluence.cfg.xml.j2', f'{CONFLUENCE_HOME}/confluence.cfg.xml',
         user=RUN_USER, group=RUN_GROUP, overwrite=UPDATE_CFG)
 
+if THREAD_SAMPLER_INTERVAL:
+    # Started before exec so it outlives the entrypoint; it waits for the JVM and exits with it
+    start_sampler(f'{CONFLUENCE_HOME}/thread_dumps/sampler', THREAD_SAMPLER_INTERVAL, THREAD_SAMPLER_MAX_DUMPS,
+                  RUN_USER, RUN_GROUP)
+
 exec_app([f'{CONFLUENCE_INSTALL_DIR}/bin/start-confluence.sh', '-fg'], CONFLUENCE_HOME,
          name='Confluence', env_cleanup=UNSET_SENSITIVE_VARS)
@@ -0,0 +1,25 @@
+import os
+
+import http_client
+
+
+def pytest_sessionfinish(session, exitstatus):
+    """Write the request timings of the run, and fail it if they regressed against a baseline."""
+    if not http_client.RESULTS.timings:
+        return
+    http_client.RESULTS.write(os.environ.get('SMOKETEST_RESULTS', 'smoketest-results.json'))
+
+    baseline = os.environ.get('SMOKETEST_BASELINE')
+    if baseline:
+        tolerance = float(os.environ.get('SMOKETEST_TOLERANCE', 0.25))
+        session.config.latency_regressions = http_client.RESULTS.regressions(baseline, tolerance)
+        if session.config.latency_regressions:
+            session.exitstatus = 1
+
+
+def pytest_terminal_summary(terminalreporter, exitstatus, config):
+    regressions = getattr(config, 'latency_regressions', None)
+    if regressions:
+        terminalreporter.write_sep('=', f"latency regressions against {os.environ['SMOKETEST_BASELINE']}", red=True)
+        for regression in regressions:
+            terminalreporter.write_line(regression)
@@ -0,0 +1,103 @@
+import json
+import os
+import re
+import statistics
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+class ResultStore:
+    """Collects per-request timings so a test run can be compared with earlier runs."""
+
+    def __init__(self):
+        self.timings = {}
+
+    def record(self, name, seconds):
+        self.timings.setdefault(name, []).append(seconds * 1000)
+
+    def summary(self):
+        return {name: {
+                    'count': len(values),
+                    'p50_ms': round(statistics.median(values), 1),
+                    'p95_ms': round(sorted(values)[max(0, int(len(values) * 0.95 + 0.5) - 1)], 1),
+                    'max_ms': round(max(values), 1),
+                }
+                for name, values in sorted(self.timings.items())}
+
+    def write(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.summary(), f, indent=2)
+
+    def regressions(self, baseline_path, tolerance):
+        """Requests whose median latency is worse than in the baseline by more than tolerance."""
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+        failures = []
+        for name, current in self.summary().items():
+            previous = baseline.get(name)
+            if previous and current['p50_ms'] > previous['p50_ms'] * (1 + tolerance):
+                failures.append(f"{name}: p50 {current['p50_ms']}ms vs baseline {previous['p50_ms']}ms")
+        return failures
+
+
+RESULTS = ResultStore()
+
+
+def request_name(method, url):
+    """Group requests by method and path, with numeric IDs and query strings folded away."""
+    path = re.sub(r'^https?://[^/]+', '', url).split('?')[0]
+    return f"{method} {re.sub(r'/[0-9]+(?=/|$)', '/{id}', path)}"
+
+
+class Client:
+    """A keep-alive session with retries on transient errors and per-request timing."""
+
+    def __init__(self, auth=None, retries=None, backoff=None, timeout=30, results=RESULTS):
+        retries = int(os.environ.get('SMOKETEST_RETRIES', 3) if retries is None else retries)
+        backoff = float(os.environ.get('SMOKETEST_BACKOFF', 0.2) if backoff is None else backoff)
+        retry = Retry(total=retries, backoff_factor=backoff, status_forcelist=(502, 503, 504),
+                      raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=retry)
+
+        self.session = requests.Session()
+        self.session.auth = auth
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.timeout = timeout
+        self.results = results
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        start = time.perf_counter()
+        r = self.session.request(method, url, **kwargs)
+        self.results.record(request_name(method, url), time.perf_counter() - start)
+        return r
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def put(self, url, **kwargs):
+        return self.request('PUT', url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self.request('DELETE', url, **kwargs)
+
+    def poll(self, url, until, max_wait, initial_interval=0.1, max_interval=2, **kwargs):
+        """GET url until `until(response)` is true or max_wait seconds pass, backing off exponentially.
+
+        Returns the last response.
+        """
+        deadline = time.monotonic() + max_wait
+        interval = initial_interval
+        while True:
+            r = self.get(url, **kwargs)
+            if until(r) or time.monotonic() + interval > deadline:
+                return r
+            time.sleep(interval)
+            interval = min(interval * 2, max_interval)
@@ -1,10 +1,9 @@
 import pytest
-import requests
 import os
-import time
 import json
 from requests.auth import HTTPBasicAuth
 import file_helper
+import http_client
 
 
 def test_create_space(space_key):
@@ -23,7 +22,7 @@ def test_create_space(space_key):
     }
     headers = {'Content-Type': 'application/json'}
 
-    r = requests.post(url, data=json.dumps(data), headers=headers, auth=auth)
+    r = client.post(url, data=json.dumps(data), headers=headers)
     assert r.status_code == 200, \
         f'failed to create space {space_key}! status:{r.status_code}'
 
@@ -47,7 +46,7 @@ def test_create_content(space_key, title, content, content_id):
     }
     headers = {'Content-Type': 'application/json'}
 
-    r = requests.post(url, data=json.dumps(data), headers=headers, auth=auth)
+    r = client.post(url, data=json.dumps(data), headers=headers)
     assert r.status_code == 200, \
         f'failed to create page "{title}"! status:{r.status_code}'
     result = json.loads(r.text)
@@ -56,17 +55,9 @@ def test_create_content(space_key, title, content, content_id):
 
 def test_search_content(content):
     url = f"{REST_API_URL}/content/search?cql=text~'{content}'"
-    attempts = 0
-    while True:
-        r = requests.get(url, auth=auth)
-        if r.status_code == 200:
-            if len(json.loads(r.text)['results']) > 0:
-                break
-        attempts += 1
-        if attempts > max_wait_for_response:
-            break
-        # Add more delay if index still updating and no result is returned
-        time.sleep(1)
+    # The index may still be updating, so poll until a result is returned
+    r = client.poll(url, lambda r: r.status_code == 200 and len(json.loads(r.text)['results']) > 0,
+                    max_wait=max_wait_for_response)
 
     assert r.status_code == 200, \
         f'failed to search content! status:{r.status_code}'
@@ -76,7 +67,7 @@ def test_search_content(content):
 
 def test_view_content(content_id):
     url = f"{REST_API_URL}/content/{content_id['val']}?expand=body.view"
-    r = requests.get(url, auth=auth)
+    r = client.get(url)
     assert r.status_code == 200, \
         f'failed to view the page! status:{r.status_code}'
     assert len(json.loads(r.text)['body']['view']['value']) > 0, \
@@ -102,7 +93,7 @@ def test_edit_content(content_id):
     }
     headers = {'Content-Type': 'application/json'}
 
-    r = requests.put(url, data=json.dumps(data), headers=headers, auth=auth)
+    r = client.put(url, data=json.dumps(data), headers=headers)
     assert r.status_code == 200, \
         f'failed to edit page "{title}"! status:{r.status_code}'
 
@@ -112,7 +103,7 @@ def test_add_attachments(content_id, tempfile):
     headers = {'X-Atlassian-Token': 'no-check'}
     # no content-type here!
 
-    r = requests.post(url, headers=headers, files=tempfile, auth=auth)
+    r = client.post(url, headers=headers, files=tempfile)
     assert r.status_code == 200, \
         f'failed to upload the attachment! status:{r.status_code}'
 
@@ -120,7 +111,7 @@ def test_add_attachments(content_id, tempfile):
 def test_retrieve_attachment(content_id, tempfile):
     url = f"{REST_API_URL}/content/{content_id['val']}/child/attachment"
     headers = {'Content-Type': 'application/json'}
-    r = requests.get(url, headers=headers, auth=auth)
+    r = client.get(url, headers=headers)
     assert r.status_code == 200,\
         f'failed to find the attachments! status:{r.status_code}'
     result = json.loads(r.text)
@@ -128,23 +119,18 @@ def test_retrieve_attachment(content_id, tempfile):
     assert tempfile['file'][0].endswith(result['results'][0]['title']), \
         "The attachment file is not found!"
     downloadurl = f"{BASE_URL}{result['results'][0]['_links']['download']}"
-    attempts = 0
-    while True:
-        r = requests.get(downloadurl, headers=headers, auth=auth)
-        assert r.status_code == 200, "Unable to download the attachment!"
-        file_content = open(tempfile['file'][0], 'r').read()
-        if file_content == r.text or attempts > max_wait_for_response:
-            break
-        # makes more delay to upload from last test get in place
-        attempts += 1
-        time.sleep(1)
+    file_content = open(tempfile['file'][0], 'r').read()
+    # The upload from the last test may not be in place yet
+    r = client.poll(downloadurl, lambda r: r.status_code != 200 or r.text == file_content,
+                    max_wait=max_wait_for_response, headers=headers)
+    assert r.status_code == 200, "Unable to download the attachment!"
     assert file_content == r.text,\
         "The content of downloaded file is not match with the original file"
 
 
 def test_delete_content(content_id):
     url = f"{REST_API_URL}/content/{content_id['val']}"
-    r = requests.delete(url, auth=auth)
+    r = client.delete(url)
     # returns 200(trash) or 204(purge) on success and 404 or 409 if failed
     assert r.status_code == 200 or r.status_code == 204,\
         f'failed to delete the page! status:{r.status_code}'
@@ -153,7 +139,7 @@ def test_delete_content(content_id):
 
 def test_delete_space(space_key):
     url = f"{REST_API_URL}/space/{space_key}"
-    r = requests.delete(url, auth=auth)
+    r = client.delete(url)
     # returns 202 on success and 404 if failed
     assert r.status_code == 202, \
         f'failed to delete the space! status:{r.status_code}'
@@ -161,13 +147,7 @@ def test_delete_space(space_key):
 
 
 def confirm_status_404(url):
-    attempts = 0
-    while True:
-        r = requests.get(url, auth=auth)
-        if r.status_code == 404 or attempts >= max_wait_for_response:
-            break
-        attempts += 1
-        time.sleep(1)
+    r = client.poll(url, lambda r: r.status_code == 404, max_wait=max_wait_for_response)
     assert r.status_code == 404, f'failed to confirm status code 404!'
 
 
@@ -207,5 +187,6 @@ REST_API_URL = f"{BASE_URL}/rest/api"
 password = os.environ.get('CONFLUENCE_ADMIN_PWD', 'admin')
 user = os.environ.get('CONFLUENCE_ADMIN', 'admin')
 auth = HTTPBasicAuth(user, password)
+client = http_client.Client(auth=auth)
 max_wait_for_response = 30
 files = file_helper.create_temp_files()
@@ -0,0 +1,58 @@
+import os
+import re
+
+
+# Named JVM tuning profiles, expanded per JDK major version. Confluence's
+# setenv.sh always enables G1, so profiles selecting another collector must
+# switch it off first to avoid a "conflicting collector" startup failure.
+PROFILES = {
+    'throughput': {
+        11: ['-XX:-UseG1GC', '-XX:+UseParallelGC', '-XX:+UseNUMA', '-XX:+AlwaysPreTouch'],
+        17: ['-XX:-UseG1GC', '-XX:+UseParallelGC', '-XX:+UseNUMA', '-XX:+AlwaysPreTouch'],
+    },
+    'low-latency': {
+        11: ['-XX:+UseG1GC', '-XX:MaxGCPauseMillis=100', '-XX:+ParallelRefProcEnabled',
+             '-XX:+UseStringDeduplication'],
+        17: ['-XX:-UseG1GC', '-XX:+UseZGC'],
+    },
+    'small-footprint': {
+        11: ['-XX:-UseG1GC', '-XX:+UseSerialGC', '-XX:TieredStopAtLevel=1', '-XX:CICompilerCount=1',
+             '-XX:MinHeapFreeRatio=10', '-XX:MaxHeapFreeRatio=20', '-Xss512k'],
+        17: ['-XX:-UseG1GC', '-XX:+UseSerialGC', '-XX:TieredStopAtLevel=1', '-XX:CICompilerCount=1',
+             '-XX:MinHeapFreeRatio=10', '-XX:MaxHeapFreeRatio=20', '-Xss512k'],
+    },
+}
+
+
+def java_major_version(java_home=None):
+    """Return the major version of the JDK in JAVA_HOME, e.g. 11 or 17."""
+    java_home = java_home or os.environ.get('JAVA_HOME', '/opt/java/openjdk')
+    version = None
+    try:
+        with open(f'{java_home}/release') as release:
+            for line in release:
+                if line.startswith('JAVA_VERSION='):
+                    version = line.split('=', 1)[1].strip().strip('"')
+                    break
+    except OSError:
+        pass
+    # Fall back to the variable set by the eclipse-temurin base images, e.g. 'jdk-17.0.7+7'
+    version = version or os.environ.get('JAVA_VERSION', '')
+    match = re.match(r'(?:jdk-?)?(\d+)(?:\.(\d+))?', version)
+    if not match:
+        raise ValueError(f"Unable to determine the JDK version from '{version}'")
+    major = int(match.group(1))
+    if major == 1 and match.group(2):
+        major = int(match.group(2))
+    return major
+
+
+def profile_args(profile, jdk_major):
+    """Return the JVM arguments for a named profile on the given JDK."""
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown JVM tuning profile '{profile}'; "
+                         f"valid profiles are: {', '.join(PROFILES)}")
+    if jdk_major not in PROFILES[profile]:
+        raise ValueError(f"JVM tuning profile '{profile}' is not available for JDK {jdk_major}; "
+                         f"supported versions are: {', '.join(map(str, PROFILES[profile]))}")
+    return list(PROFILES[profile][jdk_major])
@@ -0,0 +1,270 @@
+#!/usr/bin/python3 -B
+
+"""Thread dump sampling and aggregation for the Confluence JVM.
+
+    jvm_threads.py sample --dir DIR [--interval SECONDS] [--max-dumps COUNT]
+    jvm_threads.py aggregate --dir DIR [--window SECONDS] [--top COUNT] [--collapsed FILE]
+    jvm_threads.py busy [--pid PID] [--port PORT]
+
+`sample` captures a thread dump with `jcmd` at a fixed interval and keeps the
+most recent dumps in DIR as a ring buffer. `aggregate` folds the stacks in DIR
+into collapsed (flame graph) format and ranks the hottest and most blocked
+frames per time window. `busy` prints the number of in-flight HTTP requests
+on a connector and of threads inside a JDBC call, as used by shutdown-wait.sh
+to drain the node before stopping it.
+"""
+
+import argparse
+import collections
+import datetime
+import logging
+import os
+import re
+import subprocess
+import sys
+import time
+
+from local_storage import prepare_local_dir
+
+
+BOOTSTRAP_CLASS = 'org.apache.catalina.startup.Bootstrap'
+DUMP_SUFFIX = '.tdump'
+
+# Top frames of threads that are RUNNABLE but idle, waiting for connections or I/O events
+IDLE_FRAMES = (
+    'sun.nio.ch.EPoll.wait',
+    'sun.nio.ch.EPollArrayWrapper.epollWait',
+    'sun.nio.ch.Net.accept',
+    'sun.nio.ch.ServerSocketChannelImpl.accept0',
+    'java.net.PlainSocketImpl.socketAccept',
+)
+
+# Frames an idle Tomcat request thread parks in while waiting for work
+IDLE_EXECUTOR_FRAMES = (
+    'org.apache.tomcat.util.threads.TaskQueue.take',
+    'org.apache.tomcat.util.threads.TaskQueue.poll',
+)
+JDBC_DRIVER_PACKAGES = ('org.postgresql.', 'com.mysql.', 'com.microsoft.sqlserver.', 'oracle.jdbc.')
+
+Thread = collections.namedtuple('Thread', ['name', 'state', 'frames', 'waiting_on'])
+
+THREAD_HEADER = re.compile(r'^"(?P<name>.*)" ')
+THREAD_STATE = re.compile(r'^\s+java\.lang\.Thread\.State: (?P<state>\w+)')
+STACK_FRAME = re.compile(r'^\s+at (?P<frame>[^(]+)')
+LOCK_WAIT = re.compile(r'^\s+- (?:waiting to lock|waiting on|parking to wait for)\s+<[^>]*> \(a (?P<lock>[^)]+)\)')
+
+
+def find_jvm_pid():
+    """Return the PID of the running Tomcat JVM, or None."""
+    for pid in filter(str.isdigit, os.listdir('/proc')):
+        try:
+            with open(f'/proc/{pid}/cmdline', 'rb') as f:
+                cmdline = f.read().split(b'\0')
+        except OSError:
+            continue
+        if BOOTSTRAP_CLASS.encode() in cmdline:
+            return int(pid)
+    return None
+
+
+def capture_dump(pid, timeout=30):
+    """Capture a single thread dump from the JVM with the given PID."""
+    result = subprocess.run(['jcmd', str(pid), 'Thread.print'], capture_output=True, text=True,
+                            timeout=timeout, check=True)
+    return result.stdout
+
+
+def parse_dump(text):
+    """Parse a HotSpot thread dump into a list of Thread tuples; frames are innermost first."""
+    threads = []
+    name = state = waiting_on = None
+    frames = []
+
+    def flush():
+        if name is not None:
+            threads.append(Thread(name, state, tuple(frames), waiting_on))
+
+    for line in text.splitlines():
+        header = THREAD_HEADER.match(line)
+        if header:
+            flush()
+            name, state, waiting_on, frames = header.group('name'), None, None, []
+            continue
+        if name is None:
+            continue
+        match = THREAD_STATE.match(line)
+        if match:
+            state = match.group('state')
+            continue
+        match = STACK_FRAME.match(line)
+        if match:
+            frames.append(match.group('frame').strip())
+            continue
+        match = LOCK_WAIT.match(line)
+        if match and waiting_on is None and len(frames) == 1:
+            waiting_on = match.group('lock')
+    flush()
+    return threads
+
+
+def list_dumps(dump_dir):
+    """Return (timestamp-in-ms, path) for every dump in dump_dir, oldest first."""
+    dumps = []
+    for entry in os.listdir(dump_dir):
+        stem = entry[:-len(DUMP_SUFFIX)]
+        if entry.endswith(DUMP_SUFFIX) and stem.isdigit():
+            dumps.append((int(stem), os.path.join(dump_dir, entry)))
+    return sorted(dumps)
+
+
+def sample(dump_dir, interval, max_dumps):
+    """Capture thread dumps into a bounded ring buffer until the JVM exits."""
+    pid = None
+    while pid is None:
+        pid = find_jvm_pid()
+        if pid is None:
+            time.sleep(1)
+    # Only once the JVM runs, as the home directory's permissions are fixed just before it starts
+    os.makedirs(dump_dir, exist_ok=True)
+    logging.info(f"Sampling thread dumps of PID {pid} every {interval}s into {dump_dir} "
+                 f"(keeping {max_dumps} dumps)")
+
+    next_sample = time.monotonic()
+    while os.path.exists(f'/proc/{pid}'):
+        try:
+            dump = capture_dump(pid)
+        except (subprocess.SubprocessError, OSError) as e:
+            logging.warning(f"Thread dump of PID {pid} failed: {e}")
+        else:
+            target = os.path.join(dump_dir, f'{int(time.time() * 1000)}{DUMP_SUFFIX}')
+            with open(f'{target}.tmp', 'w') as f:
+                f.write(dump)
+            os.replace(f'{target}.tmp', target)
+            for _, expired in list_dumps(dump_dir)[:-max_dumps]:
+                os.remove(expired)
+
+        next_sample += interval
+        time.sleep(max(0, next_sample - time.monotonic()))
+    logging.info(f"PID {pid} has exited; thread dump sampling stopped")
+
+
+def start_sampler(dump_dir, interval, max_dumps, user, group):
+    """Run `sample` in the background as user, so that it outlives an exec'ing caller.
+
+    The settings are checked first, as a sampler failing on them would otherwise
+    go unnoticed. Returns the sampler process, or None if it was not started.
+    """
+    try:
+        if float(interval) <= 0 or int(max_dumps) < 1:
+            raise ValueError
+    except ValueError:
+        logging.error(f"Invalid ATL_THREAD_SAMPLER_INTERVAL '{interval}' or ATL_THREAD_SAMPLER_MAX_DUMPS "
+                      f"'{max_dumps}'; expected positive numbers, thread dump sampling is disabled")
+        return None
+
+    # The home directory's permissions aren't fixed until Confluence starts, so hand the dump directories over now
+    prepare_local_dir(os.path.dirname(dump_dir), user, group)
+    prepare_local_dir(dump_dir, user, group)
+    cmd = [sys.executable, '-B', os.path.abspath(__file__), 'sample',
+           '--dir', dump_dir, '--interval', interval, '--max-dumps', max_dumps]
+    sampler_env = {k: v for k, v in os.environ.items() if k in ('PATH', 'JAVA_HOME', 'TMPDIR')}
+    # Drop root's supplementary groups as well, as the sampler lives as long as Confluence
+    sampler_user = {'user': user, 'group': group, 'extra_groups': []} if os.getuid() == 0 else {}
+    return subprocess.Popen(cmd, env=sampler_env, start_new_session=True, **sampler_user)
+
+
+def aggregate(dump_dir, window):
+    """Fold all dumps in dump_dir.
+
+    Returns the collapsed stack counts across all dumps, and a list of
+    (window start, dump count, hot frame counts, blocked frame counts) per
+    time window of `window` seconds.
+    """
+    collapsed = collections.Counter()
+    windows = collections.OrderedDict()
+    for timestamp, path in list_dumps(dump_dir):
+        with open(path) as f:
+            threads = parse_dump(f.read())
+        start = timestamp // (window * 1000) * window
+        counts = windows.setdefault(start, [0, collections.Counter(), collections.Counter()])
+        counts[0] += 1
+        hot, blocked = counts[1], counts[2]
+
+        for thread in threads:
+            if not thread.frames:
+                continue
+            collapsed[';'.join(reversed(thread.frames))] += 1
+            top = thread.frames[0]
+            if thread.state == 'RUNNABLE' and top not in IDLE_FRAMES:
+                hot[top] += 1
+            elif thread.state == 'BLOCKED':
+                blocked[f'{top} (on {thread.waiting_on})' if thread.waiting_on else top] += 1
+
+    return collapsed, [(start, *counts) for start, counts in windows.items()]
+
+
+def busy_threads(threads, port):
+    """Return the number of in-flight requests on the connector at `port` and of threads in a JDBC call."""
+    exec_thread = re.compile(rf'^https?-\w+-{port}-exec-\d+$')
+    requests = sum(1 for thread in threads
+                   if exec_thread.match(thread.name)
+                   and not any(frame in IDLE_EXECUTOR_FRAMES for frame in thread.frames))
+    db_calls = sum(1 for thread in threads
+                   if thread.state == 'RUNNABLE'
+                   and any(frame.startswith(JDBC_DRIVER_PACKAGES) for frame in thread.frames))
+    return requests, db_calls
+
+
+def print_report(windows, top, out=sys.stdout):
+    for start, dumps, hot, blocked in windows:
+        when = datetime.datetime.fromtimestamp(start, tz=datetime.timezone.utc).isoformat()
+        print(f'Window {when} ({dumps} dumps)', file=out)
+        for title, counts in (('Hottest frames', hot), ('Most blocked frames', blocked)):
+            print(f'  {title}:', file=out)
+            for frame, count in counts.most_common(top):
+                print(f'    {count:6d}  {frame}', file=out)
+        print(file=out)
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description='Sample and aggregate thread dumps of the Confluence JVM.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    sample_cmd = commands.add_parser('sample', help='capture thread dumps into a ring buffer')
+    sample_cmd.add_argument('--dir', required=True, help='directory to keep the dumps in')
+    sample_cmd.add_argument('--interval', type=float, default=10, help='seconds between dumps (default: 10)')
+    sample_cmd.add_argument('--max-dumps', type=int, default=360, help='number of dumps to keep (default: 360)')
+
+    aggregate_cmd = commands.add_parser('aggregate', help='fold and rank the captured stacks')
+    aggregate_cmd.add_argument('--dir', required=True, help='directory containing the dumps')
+    aggregate_cmd.add_argument('--window', type=int, default=60, help='window size in seconds (default: 60)')
+    aggregate_cmd.add_argument('--top', type=int, default=10, help='frames to show per window (default: 10)')
+    aggregate_cmd.add_argument('--collapsed', help='write collapsed stacks, for flamegraph.pl or speedscope, to this file')
+
+    busy_cmd = commands.add_parser('busy', help='print the number of in-flight requests and JDBC calls')
+    busy_cmd.add_argument('--pid', type=int, help='PID of the JVM (default: find the Tomcat JVM)')
+    busy_cmd.add_argument('--port', type=int, default=8090, help='Tomcat connector port (default: 8090)')
+
+    args = parser.parse_args()
+    if args.command == 'sample':
+        if args.interval <= 0 or args.max_dumps < 1:
+            parser.error('--interval and --max-dumps must be positive')
+        sample(args.dir, args.interval, args.max_dumps)
+    elif args.command == 'busy':
+        pid = args.pid or find_jvm_pid()
+        if pid is None:
+            sys.exit('No running Tomcat JVM found')
+        requests, db_calls = busy_threads(parse_dump(capture_dump(pid)), args.port)
+        print(requests, db_calls)
+    else:
+        collapsed, windows = aggregate(args.dir, args.window)
+        if args.collapsed:
+            with open(args.collapsed, 'w') as f:
+                for stack, count in collapsed.most_common():
+                    f.write(f'{stack} {count}\n')
+        print_report(windows, args.top)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+import concurrent.futures
+import grp
+import logging
+import os
+import pwd
+import shutil
+import time
+
+
+READ_CHUNK_SIZE = 1024 * 1024
+
+
+SCRATCH_MARKER = '.atl-scratch'
+# Created by mkfs at the root of a filesystem, so present on any freshly mounted volume
+IGNORED_ENTRIES = ('lost+found',)
+
+
+def prepare_local_dir(path, user, group, recursive=False):
+    """Create a node-local directory and, when running as root, hand it to the run user.
+
+    If recursive is set, existing contents are handed over too, e.g. files left
+    on a persistent disk by a container running as another user.
+    """
+    os.makedirs(path, exist_ok=True)
+    if os.getuid() == 0:
+        shutil.chown(path, user=user, group=group)
+        if recursive:
+            uid, gid = pwd.getpwnam(user).pw_uid, grp.getgrnam(group).gr_gid
+            for root, dirs, files in os.walk(path):
+                for name in dirs + files:
+                    try:
+                        os.lchown(os.path.join(root, name), uid, gid)
+                    except FileNotFoundError:
+                        pass
+
+
+def prepare_scratch_dir(path, user, group):
+    """Create a node-local scratch directory, emptying it if it was created by an earlier run.
+
+    A directory is only ever emptied if it carries the SCRATCH_MARKER file left
+    by this function; any other non-empty directory raises ValueError, so that
+    a mistyped path can't wipe the system. Entries which can't be removed, e.g.
+    those owned by another user, are logged and left in place.
+    """
+    os.makedirs(path, exist_ok=True)
+    marker = os.path.join(path, SCRATCH_MARKER)
+    entries = [entry for entry in os.scandir(path) if entry.name not in IGNORED_ENTRIES + (SCRATCH_MARKER,)]
+    if entries and not os.path.exists(marker):
+        raise ValueError(f"Refusing to empty '{path}' as it is not empty and was not created as a scratch "
+                         f"directory; use a new or empty directory")
+    for entry in entries:
+        try:
+            if entry.is_dir(follow_symlinks=False):
+                shutil.rmtree(entry.path)
+            else:
+                os.remove(entry.path)
+        except OSError as e:
+            logging.warning(f"Unable to remove {entry.path} from the scratch directory: {e}")
+    if not os.path.exists(marker):
+        with open(marker, 'w') as f:
+            f.write('Created by the Confluence container entrypoint; emptied on every start.\n')
+    if os.getuid() == 0:
+        shutil.chown(path, user=user, group=group)
+
+
+def _prefetch_file(path):
+    """Read path through, returning the bytes read, or None if it can't be read."""
+    try:
+        with open(path, 'rb', buffering=0) as f:
+            os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_WILLNEED)
+            size = 0
+            while True:
+                read = len(f.read(READ_CHUNK_SIZE))
+                if not read:
+                    return size
+                size += read
+    except OSError:
+        # e.g. a dangling symlink, an unreadable file or one removed during the walk
+        return None
+
+
+def prefetch_dir(path, threads):
+    """Pull every file under path into the page cache, in parallel.
+
+    Each file is first given a WILLNEED readahead hint, so that the kernel can
+    start fetching it while the other workers are busy, and then read through.
+    Files which can't be read are skipped. Returns the number of files read,
+    the number of bytes read, the number of files skipped and the elapsed time
+    in seconds.
+    """
+    start = time.monotonic()
+    files = [os.path.join(root, name) for root, _, names in os.walk(path) for name in names]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as executor:
+        sizes = list(executor.map(_prefetch_file, files))
+    read = [size for size in sizes if size is not None]
+    return len(read), sum(read), len(sizes) - len(read), time.monotonic() - start
+
+
+def prepare_lucene_index(index_dir, user, group, prefetch=True, prefetch_threads='8'):
+    """Set up a node-local Lucene index directory and warm the page cache with its contents.
+
+    The warm-up is only an optimisation, so problems with it are logged rather
+    than raised. Raises ValueError if no index directory is given.
+    """
+    if not index_dir:
+        raise ValueError('ATL_LUCENE_INDEX_LOCAL requires ATL_LUCENE_INDEX_DIR to be set to a node-local directory')
+    # A persistent local disk may hold an index written by a container running as another user
+    prepare_local_dir(index_dir, user, group, recursive=True)
+    if not prefetch:
+        return
+
+    try:
+        threads = int(prefetch_threads)
+        if threads < 1:
+            raise ValueError
+    except ValueError:
+        logging.warning(f"Invalid ATL_LUCENE_INDEX_PREFETCH_THREADS '{prefetch_threads}'; "
+                        f"expected a positive integer, using 8")
+        threads = 8
+    try:
+        files, size, skipped, elapsed = prefetch_dir(index_dir, threads)
+    except OSError as e:
+        logging.warning(f"Unable to prefetch the Lucene index in {index_dir}: {e}")
+        return
+    logging.info(f"Prefetched {files} Lucene index files ({size // (1024 * 1024)} MiB) from {index_dir} "
+                 f"in {elapsed:.2f}s")
+    if skipped:
+        logging.warning(f"Skipped {skipped} unreadable files while prefetching {index_dir}")
@@ -7,6 +7,12 @@
 # primarily intended for use in environments that provide an orderly
 # shutdown mechanism, in particular the Kubernetes `preStop` hook.
 #
+# Before stopping, the node is drained: a readiness marker file is
+# created (see ATL_SHUTDOWN_DRAIN_MARKER), and the script waits until no
+# HTTP requests or database calls are in flight, or until
+# ATL_SHUTDOWN_DRAIN_TIMEOUT seconds have passed. Draining is off unless
+# the timeout is set above 0.
+#
 # This script will wait for the process to exit indefinitely; however
 # most run-time tools (including Docker and Kubernetes) have their own
 # shutdown timeouts that will send a SIGKILL if the grace period is
@@ -18,8 +24,55 @@ set -e
 
 source /opt/atlassian/support/common.sh
 
+DRAIN_TIMEOUT=${ATL_SHUTDOWN_DRAIN_TIMEOUT:-0}
+DRAIN_DELAY=${ATL_SHUTDOWN_DRAIN_DELAY:-0}
+DRAIN_MARKER=${ATL_SHUTDOWN_DRAIN_MARKER:-/tmp/confluence-draining}
+
+function now_ms {
+    echo $(( $(date +%s%N) / 1000000 ))
+}
+
+function run_as_app_user {
+    if [[ "${UID}" == 0 ]]; then
+        /bin/su ${RUN_USER} -c "$*";
+    else
+        $*;
+    fi
+}
+
+if [[ "${DRAIN_TIMEOUT}" -gt 0 ]]; then
+    echo "Draining Confluence for up to ${DRAIN_TIMEOUT}s; readiness marker ${DRAIN_MARKER} created"
+    touch ${DRAIN_MARKER}
+    drain_start=$(now_ms)
+    sleep ${DRAIN_DELAY}
+
+    requests=unknown
+    db_calls=unknown
+    while true; do
+        busy=$(run_as_app_user /jvm_threads.py busy --pid ${JVM_APP_PID} --port ${ATL_TOMCAT_PORT:-8090}) || busy=""
+        if [[ ! "${busy}" =~ ^[0-9]+\ [0-9]+$ ]]; then
+            echo "Unable to determine in-flight work; skipping drain"
+            requests=unknown
+            db_calls=unknown
+            break
+        fi
+        read requests db_calls <<< "${busy}"
+        if [[ "${requests}" == 0 && "${db_calls}" == 0 ]]; then
+            break
+        fi
+        if [[ $(( $(now_ms) - drain_start )) -ge $(( DRAIN_TIMEOUT * 1000 )) ]]; then
+            echo "Drain timeout of ${DRAIN_TIMEOUT}s expired"
+            break
+        fi
+        sleep 1
+    done
+
+    echo "Drain took $(( $(now_ms) - drain_start ))ms; ${requests} requests and ${db_calls} database calls in flight at stop"
+fi
+
 echo "Shutting down Confluence..."
 echo ${JVM_APP_PID} > ${CONFLUENCE_INSTALL_DIR}/work/catalina.pid
+stop_start=$(now_ms)
 
 if [[ "${UID}" == 0 ]]; then
     /bin/su ${RUN_USER} -c ${CONFLUENCE_INSTALL_DIR}/bin/stop-confluence.sh;
@@ -28,3 +81,6 @@ else
 fi
 
 /opt/atlassian/support/wait-pid.sh ${JVM_APP_PID}
+
+echo "Confluence stopped in $(( $(now_ms) - stop_start ))ms"
+rm -f ${DRAIN_MARKER}
@@ -3,6 +3,7 @@ import signal
 import testinfra
 from iterators import TimeoutIterator
 import re
+import time
 
 from helpers import get_app_home, get_app_install_dir, get_bootstrap_proc, get_procs, \
     parse_properties, parse_xml, run_image, \
@@ -31,6 +32,53 @@ def test_jvm_args(docker_cli, image, run_user):
     assert environment.get('JVM_SUPPORT_RECOMMENDED_ARGS') in jvm
 
 
+expected_profile_args = {
+    'throughput': {
+        11: ['-XX:+UseParallelGC', '-XX:+AlwaysPreTouch'],
+        17: ['-XX:+UseParallelGC', '-XX:+AlwaysPreTouch'],
+    },
+    'low-latency': {
+        11: ['-XX:MaxGCPauseMillis=100', '-XX:+UseStringDeduplication'],
+        17: ['-XX:+UseZGC'],
+    },
+    'small-footprint': {
+        11: ['-XX:+UseSerialGC', '-XX:TieredStopAtLevel=1'],
+        17: ['-XX:+UseSerialGC', '-XX:TieredStopAtLevel=1'],
+    },
+}
+
+@pytest.mark.parametrize("profile", expected_profile_args.keys())
+def test_jvm_tuning_profile(docker_cli, image, run_user, profile):
+    environment = {
+        'JVM_TUNING_PROFILE': profile,
+        'JVM_SUPPORT_RECOMMENDED_ARGS': '-verbose:gc',
+    }
+    container = run_image(docker_cli, image, user=run_user, environment=environment, ports={PORT: PORT})
+    _jvm = wait_for_proc(container, get_bootstrap_proc(container))
+
+    release = container.file('/opt/java/openjdk/release').content_string
+    jdk_major = int(re.search(r'JAVA_VERSION="(\d+)', release).group(1))
+
+    procs_list = get_procs(container)
+    jvm = [proc for proc in procs_list if get_bootstrap_proc(container) in proc][0]
+
+    for arg in expected_profile_args[profile][jdk_major]:
+        assert arg in jvm
+    assert environment.get('JVM_SUPPORT_RECOMMENDED_ARGS') in jvm
+
+    # The reduced thread stacks and C1-only compilation must still get Confluence up
+    wait_for_http_response(STATUS_URL, expected_status=200, expected_state=('STARTING', 'FIRST_RUN'), max_wait=120)
+    assert 'StackOverflowError' not in container.logs().decode()
+
+
+def test_jvm_tuning_profile_invalid(docker_cli, image, run_user):
+    environment = {
+        'JVM_TUNING_PROFILE': 'turbo',
+    }
+    container = docker_cli.containers.run(image, detach=True, user=run_user, environment=environment)
+    wait_for_log(container, "Unknown JVM tuning profile 'turbo'")
+
+
 def test_install_permissions(docker_cli, image):
     container = run_image(docker_cli, image)
 
@@ -69,6 +117,17 @@ def test_shutdown_script(docker_cli, image, run_user):
     wait_for_log(container, end)
 
 
+def test_shutdown_script_drain(docker_cli, image, run_user):
+    container = docker_cli.containers.run(image, detach=True, user=run_user, ports={PORT: PORT})
+    wait_for_state(STATUS_URL, expected_state='FIRST_RUN')
+
+    result = container.exec_run('/shutdown-wait.sh', environment={'ATL_SHUTDOWN_DRAIN_TIMEOUT': '10'})
+    output = result.output.decode('UTF-8')
+
+    assert re.search(r'Drain took \d+ms; 0 requests and \d+ database calls in flight at stop', output)
+    assert re.search(r'Confluence stopped in \d+ms', output)
+
+
 def test_server_xml_defaults(docker_cli, image):
     container = run_image(docker_cli, image)
     _jvm = wait_for_proc(container, get_bootstrap_proc(container))
@@ -94,6 +153,8 @@ def test_server_xml_defaults(docker_cli, image):
     assert connector.get('maxHttpHeaderSize') == '8192'
 
     assert context.get('path') == ''
+    assert xml.find('.//Host').get('startStopThreads') == '0'
+    assert context.find('JarScanner') is None
 
 def test_server_xml_catalina_fallback(docker_cli, image):
     environment = {
@@ -136,6 +197,7 @@ def test_server_xml_params(docker_cli, image):
         'ATL_PROXY_PORT': '443',
         'ATL_TOMCAT_MAXHTTPHEADERSIZE': '8193',
         'ATL_TOMCAT_CONTEXTPATH': '/myconf',
+        'ATL_TOMCAT_STARTSTOPTHREADS': '2',
     }
     container = run_image(docker_cli, image, environment=environment)
     _jvm = wait_for_proc(container, get_bootstrap_proc(container))
@@ -163,6 +225,60 @@ def test_server_xml_params(docker_cli, image):
     assert connector.get('maxHttpHeaderSize') == environment.get('ATL_TOMCAT_MAXHTTPHEADERSIZE')
 
     assert context.get('path') == environment.get('ATL_TOMCAT_CONTEXTPATH')
+    assert xml.find('.//Host').get('startStopThreads') == environment.get('ATL_TOMCAT_STARTSTOPTHREADS')
+
+@pytest.mark.parametrize("version, included, excluded", [
+    ('7.19.0', 'c3p0-*.jar', 'jakarta.mail-*.jar'),
+    ('8.2.1', 'jakarta.mail-*.jar', 'c3p0-*.jar'),
+])
+def test_server_xml_jarscan_prune(docker_cli, image, version, included, excluded):
+    environment = {
+        'ATL_TOMCAT_JARSCAN_PRUNE': 'true',
+        'ATL_TOMCAT_JARSCAN_SKIP': 'my-plugin-*.jar, other.jar',
+        'CONFLUENCE_VERSION': version,
+    }
+    container = run_image(docker_cli, image, environment=environment)
+    _jvm = wait_for_proc(container, get_bootstrap_proc(container))
+
+    xml = parse_xml(container, f'{get_app_install_dir(container)}/conf/server.xml')
+    scanner = xml.find('.//Context/JarScanner')
+    scan_filter = scanner.find('JarScanFilter')
+
+    assert scanner.get('scanClassPath') == 'false'
+    tld_skip = scan_filter.get('tldSkip').split(',')
+    assert tld_skip[0] == '${tomcat.util.scan.StandardJarScanFilter.jarsToSkip}'
+    assert 'lucene-*.jar' in tld_skip
+    assert included in tld_skip
+    assert excluded not in tld_skip
+    assert tld_skip[-2:] == ['my-plugin-*.jar', 'other.jar']
+    assert scan_filter.get('pluggabilitySkip') == scan_filter.get('tldSkip')
+
+def test_server_xml_resource_cache(docker_cli, image):
+    environment = {
+        'ATL_TOMCAT_CACHEMAXSIZE': '51200',
+    }
+    container = run_image(docker_cli, image, environment=environment)
+    _jvm = wait_for_proc(container, get_bootstrap_proc(container))
+
+    xml = parse_xml(container, f'{get_app_install_dir(container)}/conf/server.xml')
+    resources = xml.find('.//Context/Resources')
+    assert resources.get('cacheMaxSize') == environment.get('ATL_TOMCAT_CACHEMAXSIZE')
+
+def test_web_xml_expires_filter(docker_cli, image, run_user):
+    environment = {
+        'ATL_TOMCAT_EXPIRES_FILTER': 'true',
+        'ATL_TOMCAT_EXPIRES_PATHS': '/s/*,/download/resources/*',
+        'ATL_TOMCAT_EXPIRES_BY_TYPE': 'text/css=access plus 1 year;image=access plus 1 week',
+    }
+    container = run_image(docker_cli, image, user=run_user, environment=environment)
+    _jvm = wait_for_proc(container, get_bootstrap_proc(container))
+
+    web_xml = container.file(f'{get_app_install_dir(container)}/conf/web.xml').content_string
+    assert web_xml.count('<filter-name>ExpiresFilter</filter-name>') == 2
+    assert '<url-pattern>/s/*</url-pattern>' in web_xml
+    assert '<url-pattern>/download/resources/*</url-pattern>' in web_xml
+    assert '<param-name>ExpiresByType image</param-name>' in web_xml
+    assert '<param-value>access plus 1 week</param-value>' in web_xml
 
 def test_server_xml_access_log_enabled(docker_cli, image):
     environment = {
@@ -253,6 +369,60 @@ def test_confluence_xml_default_c3p0(docker_cli, image):
     assert xml.findall('.//property[@name="hibernate.connection.url"]') == []
     assert xml.findall('.//property[@name="confluence.cluster.home"]') == []
     assert xml.findall('.//property[@name="lucene.index.dir"]')[0].text == '${confluenceHome}/index'
+    assert xml.findall('.//property[@name="struts.multipart.saveDir"]')[0].text == '${localHome}/temp'
+    assert xml.findall('.//property[@name="webwork.multipart.saveDir"]')[0].text == '${localHome}/temp'
+
+
+def test_confluence_multipart_savedir(docker_cli, image):
+    environment = {
+        'ATL_MULTIPART_SAVEDIR': '/tmp/uploads',
+    }
+    container = docker_cli.containers.run(image, detach=True, environment=environment)
+    tihost = testinfra.get_host("docker://"+container.id)
+    _jvm = wait_for_proc(tihost, get_bootstrap_proc(tihost))
+
+    upload_dir = tihost.file('/tmp/uploads')
+    assert upload_dir.is_directory
+    assert upload_dir.user == 'confluence'
+
+    xml = parse_xml(tihost, f'{get_app_home(tihost)}/confluence.cfg.xml')
+    assert xml.findall('.//property[@name="struts.multipart.saveDir"]')[0].text == '/tmp/uploads'
+    assert xml.findall('.//property[@name="webwork.multipart.saveDir"]')[0].text == '/tmp/uploads'
+
+    container.exec_run('touch /tmp/uploads/stale-upload')
+    container.restart(timeout=60)
+    _jvm = wait_for_proc(tihost, get_bootstrap_proc(tihost))
+
+    assert not tihost.file('/tmp/uploads/stale-upload').exists
+
+
+@pytest.mark.parametrize("savedir", ['/', '/etc', '/opt/java/openjdk', '/var/atlassian'])
+def test_confluence_multipart_savedir_protected(docker_cli, image, savedir):
+    environment = {
+        'ATL_MULTIPART_SAVEDIR': savedir,
+    }
+    container = docker_cli.containers.run(image, detach=True, environment=environment)
+    wait_for_log(container, f"Refusing to empty '{savedir}'")
+
+
+def test_confluence_multipart_savedir_run_user(docker_cli, image, run_user):
+    environment = {
+        'ATL_MULTIPART_SAVEDIR': '/tmp/uploads',
+    }
+    container = docker_cli.containers.run(image, detach=True, user=run_user, environment=environment)
+    tihost = testinfra.get_host("docker://"+container.id)
+    _jvm = wait_for_proc(tihost, get_bootstrap_proc(tihost))
+    assert tihost.file('/tmp/uploads/.atl-scratch').exists
+
+    # Left-overs the run user can't remove, like a root-owned lost+found, must not stop the container
+    container.exec_run('touch /tmp/uploads/stale-upload')
+    container.exec_run("sh -c 'mkdir -p /tmp/uploads/root-only/dir && chmod 700 /tmp/uploads/root-only'", user='root')
+    container.restart(timeout=60)
+    _jvm = wait_for_proc(tihost, get_bootstrap_proc(tihost))
+
+    assert not tihost.file('/tmp/uploads/stale-upload').exists
+    assert tihost.file('/tmp/uploads/root-only').exists
+    wait_for_log(container, 'Unable to remove /tmp/uploads/root-only')
 
 
 def test_confluence_lucene_index(docker_cli, image):
@@ -262,6 +432,24 @@ def test_confluence_lucene_index(docker_cli, image):
     xml = parse_xml(container, f'{get_app_home(container)}/confluence.cfg.xml')
     assert xml.findall('.//property[@name="lucene.index.dir"]')[0].text == '/some/other/dir'
 
+
+def test_confluence_lucene_index_local(docker_cli, image):
+    environment = {
+        'ATL_LUCENE_INDEX_DIR': '/tmp/local-index',
+        'ATL_LUCENE_INDEX_LOCAL': 'true',
+    }
+    container = docker_cli.containers.run(image, detach=True, environment=environment)
+    tihost = testinfra.get_host("docker://"+container.id)
+    _jvm = wait_for_proc(tihost, get_bootstrap_proc(tihost))
+
+    index_dir = tihost.file('/tmp/local-index')
+    assert index_dir.is_directory
+    assert index_dir.user == 'confluence'
+    wait_for_log(container, r'Prefetched \d+ Lucene index files \(\d+ MiB\) from /tmp/local-index in [\d.]+s')
+
+    xml = parse_xml(tihost, f'{get_app_home(tihost)}/confluence.cfg.xml')
+    assert xml.findall('.//property[@name="lucene.index.dir"]')[0].text == '/tmp/local-index'
+
 def test_confluence_xml_postgres(docker_cli, image, run_user):
     environment = {
         'ATL_DB_TYPE': 'postgresql',
@@ -307,6 +495,62 @@ def test_confluence_xml_postgres_all_set(docker_cli, image, run_user):
     assert xml.findall('.//property[@name="hibernate.hikari.minimumIdle"]')[0].text == "x20"
 
 
+def test_confluence_xml_postgres_hikari_advanced(docker_cli, image, run_user):
+    environment = {
+        'ATL_DB_TYPE': 'postgresql',
+        'ATL_JDBC_URL': 'atl_jdbc_url',
+        'ATL_JDBC_USER': 'atl_jdbc_user',
+        'ATL_JDBC_PASSWORD': 'atl_jdbc_password',
+        'ATL_DB_MAXLIFETIME': '600000',
+        'ATL_DB_CONNECTIONTIMEOUT': '10000',
+        'ATL_DB_LEAKDETECTIONTHRESHOLD': '60000',
+        'ATL_DB_KEEPALIVETIME': '120000',
+        'ATL_DB_DRIVER_PROPERTIES': 'reWriteBatchedInserts=TRUE, prepareThreshold=-1',
+    }
+    container = run_image(docker_cli, image, user=run_user, environment=environment)
+    _jvm = wait_for_proc(container, get_bootstrap_proc(container))
+
+    xml = parse_xml(container, f'{get_app_home(container)}/confluence.cfg.xml')
+    assert xml.findall('.//property[@name="hibernate.hikari.maxLifetime"]')[0].text == "600000"
+    assert xml.findall('.//property[@name="hibernate.hikari.connectionTimeout"]')[0].text == "10000"
+    assert xml.findall('.//property[@name="hibernate.hikari.leakDetectionThreshold"]')[0].text == "60000"
+    assert xml.findall('.//property[@name="hibernate.hikari.keepaliveTime"]')[0].text == "120000"
+    assert xml.findall('.//property[@name="hibernate.hikari.dataSource.reWriteBatchedInserts"]')[0].text == "true"
+    assert xml.findall('.//property[@name="hibernate.hikari.dataSource.prepareThreshold"]')[0].text == "-1"
+
+
+def test_confluence_xml_postgres_hikari_unlimited_lifetime(docker_cli, image, run_user):
+    environment = {
+        'ATL_DB_TYPE': 'postgresql',
+        'ATL_JDBC_URL': 'atl_jdbc_url',
+        'ATL_JDBC_USER': 'atl_jdbc_user',
+        'ATL_JDBC_PASSWORD': 'atl_jdbc_password',
+        'ATL_DB_MAXLIFETIME': '0',
+        'ATL_DB_KEEPALIVETIME': '2400000',
+    }
+    container = run_image(docker_cli, image, user=run_user, environment=environment)
+    _jvm = wait_for_proc(container, get_bootstrap_proc(container))
+
+    xml = parse_xml(container, f'{get_app_home(container)}/confluence.cfg.xml')
+    assert xml.findall('.//property[@name="hibernate.hikari.maxLifetime"]')[0].text == "0"
+    assert xml.findall('.//property[@name="hibernate.hikari.keepaliveTime"]')[0].text == "2400000"
+
+
+@pytest.mark.parametrize("db_type,driver_properties", [('mysql', 'reWriteBatchedInserts=true'),
+                                                       ('postgresql', 'prepareThreshold=often'),
+                                                       ('postgresql', 'defaultRowFetchSize=²')])
+def test_confluence_xml_invalid_driver_properties(docker_cli, image, run_user, db_type, driver_properties):
+    environment = {
+        'ATL_DB_TYPE': db_type,
+        'ATL_JDBC_URL': 'atl_jdbc_url',
+        'ATL_JDBC_USER': 'atl_jdbc_user',
+        'ATL_JDBC_PASSWORD': 'atl_jdbc_password',
+        'ATL_DB_DRIVER_PROPERTIES': driver_properties,
+    }
+    container = docker_cli.containers.run(image, detach=True, user=run_user, environment=environment)
+    wait_for_log(container, 'Invalid database configuration')
+
+
 
 def test_confluence_xml_postgres_c3p0(docker_cli, image, run_user):
     environment = {
@@ -442,6 +686,65 @@ def test_confluence_xml_cluster_tcp(docker_cli, image, run_user):
     assert xml.findall('.//property[@name="confluence.cluster.name"]')[0].text == "atl_cluster_name"
     assert xml.findall('.//property[@name="confluence.cluster.peers"]')[0].text == "1.1.1.1,99.99.99.99"
 
+
+def test_confluence_xml_cluster_tcp_peers_source(docker_cli, image):
+    # A second container stands in for a running node, listening on the probed port
+    peer = docker_cli.containers.run(image, detach=True, entrypoint='python3 -m http.server 9999')
+    peer.reload()
+    peer_ip = peer.attrs['NetworkSettings']['IPAddress']
+
+    environment = {
+        'ATL_CLUSTER_TYPE': 'tcp_ip',
+        'ATL_CLUSTER_NAME': 'atl_cluster_name',
+        'ATL_CLUSTER_PEERS': '198.51.100.1',
+        'ATL_CLUSTER_PEERS_SOURCE': 'file:/tmp/peers',
+        'ATL_CLUSTER_PEERS_PORT': '9999',
+        'ATL_FORCE_CFG_UPDATE': 'true',
+    }
+    container = docker_cli.containers.run(image, detach=True, environment=environment)
+    tihost = testinfra.get_host("docker://"+container.id)
+    _jvm = wait_for_proc(tihost, get_bootstrap_proc(tihost))
+    own_ip = tihost.check_output('hostname -i').split()[0]
+
+    # No peers file yet, so ATL_CLUSTER_PEERS is used unchanged
+    xml = parse_xml(tihost, f'{get_app_home(tihost)}/confluence.cfg.xml')
+    assert xml.findall('.//property[@name="confluence.cluster.peers"]')[0].text == '198.51.100.1'
+
+    # 192.0.2.1 is reserved for documentation and will never accept the probe
+    container.exec_run(f"sh -c 'printf \"# peers\\n{own_ip}\\n{peer_ip}\\n192.0.2.1\\n\" > /tmp/peers'")
+    container.restart(timeout=60)
+    _jvm = wait_for_proc(tihost, get_bootstrap_proc(tihost))
+
+    xml = parse_xml(tihost, f'{get_app_home(tihost)}/confluence.cfg.xml')
+    assert xml.findall('.//property[@name="confluence.cluster.peers"]')[0].text == peer_ip
+
+
+def test_confluence_xml_cluster_tcp_peers_source_none_reachable(docker_cli, image):
+    environment = {
+        'ATL_CLUSTER_TYPE': 'tcp_ip',
+        'ATL_CLUSTER_NAME': 'atl_cluster_name',
+        'ATL_CLUSTER_PEERS_SOURCE': 'static:192.0.2.1,192.0.2.2',
+        'ATL_CLUSTER_PEERS_PORT': '9999',
+    }
+    container = run_image(docker_cli, image, environment=environment)
+    _jvm = wait_for_proc(container, get_bootstrap_proc(container))
+
+    xml = parse_xml(container, f'{get_app_home(container)}/confluence.cfg.xml')
+    assert xml.findall('.//property[@name="confluence.cluster.peers"]')[0].text == '192.0.2.1,192.0.2.2'
+
+def test_confluence_xml_cluster_tcp_peers_source_unreadable(docker_cli, image):
+    environment = {
+        'ATL_CLUSTER_TYPE': 'tcp_ip',
+        'ATL_CLUSTER_NAME': 'atl_cluster_name',
+        'ATL_CLUSTER_PEERS': '198.51.100.1',
+        'ATL_CLUSTER_PEERS_SOURCE': 'file:/tmp',
+    }
+    container = run_image(docker_cli, image, environment=environment)
+    _jvm = wait_for_proc(container, get_bootstrap_proc(container))
+
+    xml = parse_xml(container, f'{get_app_home(container)}/confluence.cfg.xml')
+    assert xml.findall('.//property[@name="confluence.cluster.peers"]')[0].text == '198.51.100.1'
+
 def test_confluence_xml_license(docker_cli, image, run_user):
     environment = {
         'ATL_LICENSE_KEY': 'mylicense',
@@ -453,6 +756,41 @@ def test_confluence_xml_license(docker_cli, image, run_user):
 
     assert xml.findall('.//property[@name="atlassian.license.message"]')[0].text == "mylicense"
 
+def test_thread_sampler(docker_cli, image, run_user):
+    environment = {
+        'ATL_THREAD_SAMPLER_INTERVAL': '1',
+        'ATL_THREAD_SAMPLER_MAX_DUMPS': '3',
+    }
+    container = run_image(docker_cli, image, user=run_user, environment=environment)
+    _jvm = wait_for_proc(container, get_bootstrap_proc(container))
+    dump_dir = f'{get_app_home(container)}/thread_dumps/sampler'
+
+    for _ in range(60):
+        dumps = container.run(f'ls {dump_dir}').stdout.split()
+        if len(dumps) >= 3:
+            break
+        time.sleep(1)
+    time.sleep(3)
+
+    dumps = [d for d in container.run(f'ls {dump_dir}').stdout.split() if d.endswith('.tdump')]
+    assert 0 < len(dumps) <= 3
+    assert container.file(f'{dump_dir}/{dumps[-1]}').contains('Full thread dump')
+
+    report = container.run(f'/jvm_threads.py aggregate --dir {dump_dir} --collapsed /tmp/out.folded')
+    assert 'Hottest frames' in report.stdout
+    assert container.file('/tmp/out.folded').size > 0
+
+
+@pytest.mark.parametrize("interval,max_dumps", [('abc', '3'), ('1', '0')])
+def test_thread_sampler_invalid(docker_cli, image, interval, max_dumps):
+    environment = {
+        'ATL_THREAD_SAMPLER_INTERVAL': interval,
+        'ATL_THREAD_SAMPLER_MAX_DUMPS': max_dumps,
+    }
+    container = docker_cli.containers.run(image, detach=True, environment=environment)
+    wait_for_log(container, 'thread dump sampling is disabled')
+
+
 def test_java_in_run_user_path(docker_cli, image):
     RUN_USER = 'confluence'
     container = run_image(docker_cli, image)
@@ -0,0 +1,29 @@
+import os
+import shutil
+
+
+def install_fragment(web_xml, fragment=None):
+    """Insert the XML in the file `fragment` at the end of Tomcat's default web.xml.
+
+    The distributed web.xml is kept alongside as web.xml.dist and the result is
+    always rebuilt from it, so that the change is idempotent across restarts
+    and is undone again when no fragment is given.
+    """
+    pristine = f'{web_xml}.dist'
+    if not os.path.exists(pristine):
+        if fragment is None:
+            return
+        shutil.copy2(web_xml, pristine)
+
+    with open(pristine) as f:
+        content = f.read()
+    if fragment is not None:
+        with open(fragment) as f:
+            insert = f.read()
+        end = content.rindex('</web-app>')
+        content = f'{content[:end]}{insert}\n{content[end:]}'
+
+    with open(f'{web_xml}.tmp', 'w') as f:
+        f.write(content)
+    shutil.copymode(pristine, f'{web_xml}.tmp')
+    os.replace(f'{web_xml}.tmp', web_xml)